@@ -1,7 +1,10 @@
 from aws_cdk import (
+    BundlingOptions,
     Duration,
+    Size,
     Stack,
     aws_s3 as s3,
+    aws_s3_notifications as s3n,
     aws_lambda as _lambda,
     aws_iam as iam,
     aws_glue as glue,
@@ -9,13 +12,18 @@ from aws_cdk import (
     aws_athena as athena,
     aws_events as events,
     aws_events_targets as targets,
-    aws_apigateway as apigateway,
+    aws_apigatewayv2 as apigwv2,
+    aws_apigatewayv2_integrations as apigwv2_integrations,
     aws_dynamodb as dynamodb,
+    aws_ssm as ssm,
     RemovalPolicy,
 )
 from constructs import Construct
 import json
 
+# Versión de la capa AWS SDK for pandas (AWSSDKPandas-Python312-Arm64) de la API Lambda
+AWS_SDK_PANDAS_VERSION = "3.11.0"
+
 class DataPipelineStack(Stack):
 
     def __init__(self, scope: Construct, construct_id: str, **kwargs) -> None:
@@ -62,72 +70,166 @@ class DataPipelineStack(Stack):
             removal_policy=RemovalPolicy.DESTROY
         )
 
+        # GSI por estado ordenado por fecha: pagina /results sin listar
+        # processed-data/ en S3 y cuenta jobs por estado con Query en lugar de Scan
+        self.jobs_table.add_global_secondary_index(
+            index_name="processed-index",
+            partition_key=dynamodb.Attribute(
+                name="status",
+                type=dynamodb.AttributeType.STRING
+            ),
+            sort_key=dynamodb.Attribute(
+                name="updated_at",
+                type=dynamodb.AttributeType.STRING
+            ),
+            projection_type=dynamodb.ProjectionType.INCLUDE,
+            non_key_attributes=["processed_s3_key", "processed_size"]
+        )
+
         # Grant Lambda permissions to DynamoDB
         self.jobs_table.grant_read_write_data(self.lambda_role)
 
+        # Código de cada Lambda con solo sus dependencias (lambda/requirements-*.txt),
+        # instaladas para arm64 (manylinux aarch64) igual que las funciones y sin .pyc
+        # para no acercarse al límite de 250 MB descomprimido
+        def lambda_code(requirements_file):
+            return _lambda.Code.from_asset(
+                "lambda",
+                bundling=BundlingOptions(
+                    image=_lambda.Runtime.PYTHON_3_12.bundling_image,
+                    platform="linux/arm64",
+                    command=[
+                        "bash", "-c",
+                        f"pip install --no-compile -r {requirements_file} -t /asset-output"
+                        " && cp -au . /asset-output"
+                    ]
+                )
+            )
+
+        # pandas y pyarrow (y numpy) para la API vienen de la capa administrada
+        # AWS SDK for pandas, publicada por AWS en un parámetro SSM público
+        aws_sdk_pandas_layer = _lambda.LayerVersion.from_layer_version_arn(
+            self, "AwsSdkPandasLayer",
+            ssm.StringParameter.value_for_string_parameter(
+                self, f"/aws/service/aws-sdk-pandas/{AWS_SDK_PANDAS_VERSION}/py3.12/arm64/layer-arn"
+            )
+        )
+
         # Función Lambda para extracción de datos
         self.data_extractor_lambda = _lambda.Function(
             self, "DataExtractorLambda",
-            runtime=_lambda.Runtime.PYTHON_3_10,
+            runtime=_lambda.Runtime.PYTHON_3_12,
             handler="lambda_function.lambda_handler",
-            code=_lambda.Code.from_asset("lambda"),
+            code=lambda_code("requirements-extractor.txt"),
             role=self.lambda_role,
             timeout=Duration.minutes(5),
+            # Graviton (arm64) y más memoria = más CPU por dólar
+            memory_size=1024,
+            architecture=_lambda.Architecture.ARM_64,
+            ephemeral_storage_size=Size.mebibytes(512),
             environment={
                 "BUCKET_NAME": self.data_bucket.bucket_name,
                 "API_URL": "https://jsonplaceholder.typicode.com/users"
-            }
+            },
+            snap_start=_lambda.SnapStartConf.ON_PUBLISHED_VERSIONS
+        )
+
+        # SnapStart solo aplica a versiones publicadas: los disparadores usan este alias
+        self.data_extractor_lambda_alias = _lambda.Alias(
+            self, "DataExtractorLambdaLive",
+            alias_name="live",
+            version=self.data_extractor_lambda.current_version
         )
 
         # API Lambda function for REST endpoints
         self.api_lambda = _lambda.Function(
             self, "ApiLambda",
-            runtime=_lambda.Runtime.PYTHON_3_10,
+            runtime=_lambda.Runtime.PYTHON_3_12,
             handler="api_handler.lambda_handler",
-            code=_lambda.Code.from_asset("lambda"),
+            code=lambda_code("requirements-api.txt"),
+            layers=[aws_sdk_pandas_layer],
             role=self.lambda_role,
             timeout=Duration.minutes(5),
+            # Graviton (arm64) y más memoria = más CPU por dólar
+            memory_size=1024,
+            architecture=_lambda.Architecture.ARM_64,
+            ephemeral_storage_size=Size.mebibytes(512),
             environment={
                 "BUCKET_NAME": self.data_bucket.bucket_name,
                 "TABLE_NAME": self.jobs_table.table_name
             }
         )
 
-        # API Gateway
-        self.api = apigateway.RestApi(
+        # Versión publicada + alias "live" con concurrencia aprovisionada,
+        # para que las rutas de la API no paguen arranques en frío
+        # (SnapStart no se puede combinar con concurrencia aprovisionada)
+        self.api_lambda_alias = _lambda.Alias(
+            self, "ApiLambdaLive",
+            alias_name="live",
+            version=self.api_lambda.current_version,
+            provisioned_concurrent_executions=2
+        )
+
+        # Los datos subidos con el presigned POST de /process se procesan al llegar a S3
+        self.data_bucket.add_event_notification(
+            s3.EventType.OBJECT_CREATED,
+            s3n.LambdaDestination(self.api_lambda_alias),
+            s3.NotificationKeyFilter(prefix="raw-data/", suffix="/upload.json")
+        )
+
+        # API Gateway (HTTP API, payload format 2.0)
+        self.api = apigwv2.HttpApi(
             self, "DataPipelineApi",
-            rest_api_name="Data Pipeline API",
-            description="REST API for testing the data pipeline",
-            default_cors_preflight_options=apigateway.CorsOptions(
-                allow_origins=apigateway.Cors.ALL_ORIGINS,
-                allow_methods=apigateway.Cors.ALL_METHODS,
+            api_name="Data Pipeline API",
+            description="HTTP API for testing the data pipeline",
+            cors_preflight=apigwv2.CorsPreflightOptions(
+                allow_origins=["*"],
+                allow_methods=[apigwv2.CorsHttpMethod.ANY],
                 allow_headers=["Content-Type", "X-Amz-Date", "Authorization", "X-Api-Key", "X-Amz-Security-Token"]
             )
         )
 
         # API Gateway Lambda integration
-        api_integration = apigateway.LambdaIntegration(
-            self.api_lambda,
-            request_templates={"application/json": '{"statusCode": "200"}'}
+        api_integration = apigwv2_integrations.HttpLambdaIntegration(
+            "ApiLambdaIntegration",
+            self.api_lambda_alias
         )
 
         # API Routes
         # POST /process
-        process_resource = self.api.root.add_resource("process")
-        process_resource.add_method("POST", api_integration)
+        self.api.add_routes(
+            path="/process",
+            methods=[apigwv2.HttpMethod.POST],
+            integration=api_integration
+        )
 
         # GET /status/{job_id}
-        status_resource = self.api.root.add_resource("status")
-        status_job_resource = status_resource.add_resource("{job_id}")
-        status_job_resource.add_method("GET", api_integration)
+        self.api.add_routes(
+            path="/status/{job_id}",
+            methods=[apigwv2.HttpMethod.GET],
+            integration=api_integration
+        )
+
+        # POST /status/batch
+        self.api.add_routes(
+            path="/status/batch",
+            methods=[apigwv2.HttpMethod.POST],
+            integration=api_integration
+        )
 
         # GET /results
-        results_resource = self.api.root.add_resource("results")
-        results_resource.add_method("GET", api_integration)
+        self.api.add_routes(
+            path="/results",
+            methods=[apigwv2.HttpMethod.GET],
+            integration=api_integration
+        )
 
         # GET /health
-        health_resource = self.api.root.add_resource("health")
-        health_resource.add_method("GET", api_integration)
+        self.api.add_routes(
+            path="/health",
+            methods=[apigwv2.HttpMethod.GET],
+            integration=api_integration
+        )
 
         # Base de datos de Glue
         self.glue_database = glue.CfnDatabase(
@@ -161,12 +263,25 @@ class DataPipelineStack(Stack):
                 s3_targets=[
                     glue.CfnCrawler.S3TargetProperty(
                         path=f"s3://{self.data_bucket.bucket_name}/data/"
+                    ),
+                    # Datos procesados por la API en formato Parquet (clasificador nativo de Glue)
+                    glue.CfnCrawler.S3TargetProperty(
+                        path=f"s3://{self.data_bucket.bucket_name}/processed-data/"
                     )
                 ]
             ),
             schedule=glue.CfnCrawler.ScheduleProperty(
                 schedule_expression="cron(0 2 * * ? *)"
-            )
+            ),
+            # processed-data/ está particionado por year=/month=/day=; las
+            # particiones heredan el esquema de la tabla en lugar de crear uno por objeto
+            configuration=json.dumps({
+                "Version": 1.0,
+                "CrawlerOutput": {
+                    "Partitions": {"AddOrUpdateBehavior": "InheritFromTable"}
+                },
+                "Grouping": {"TableGroupingPolicy": "CombineCompatibleSchemas"}
+            })
         )
 
         # Configuración de Athena Workgroup
@@ -198,16 +313,26 @@ class DataPipelineStack(Stack):
             self, "LambdaScheduleRule",
             schedule=events.Schedule.rate(Duration.hours(1))
         )
-        lambda_schedule.add_target(targets.LambdaFunction(self.data_extractor_lambda))
+        lambda_schedule.add_target(targets.LambdaFunction(self.data_extractor_lambda_alias))
 
         # Permisos para EventBridge invocar Lambda
-        self.data_extractor_lambda.add_permission(
+        self.data_extractor_lambda_alias.add_permission(
             "AllowEventBridge",
             principal=iam.ServicePrincipal("events.amazonaws.com"),
             action="lambda:InvokeFunction",
             source_arn=lambda_schedule.rule_arn
         )
 
+        # EventBridge rule para mantener calientes las Lambdas cada 5 minutos
+        # (los handlers responden al evento {"warmer": true} sin procesar nada)
+        warmer_rule = events.Rule(
+            self, "LambdaWarmerRule",
+            schedule=events.Schedule.rate(Duration.minutes(5))
+        )
+        warmer_input = events.RuleTargetInput.from_object({"warmer": True})
+        warmer_rule.add_target(targets.LambdaFunction(self.api_lambda_alias, event=warmer_input))
+        warmer_rule.add_target(targets.LambdaFunction(self.data_extractor_lambda_alias, event=warmer_input))
+
         # Lake Formation - Configuración de permisos de datos
         # Nota: Lake Formation requiere configuración manual adicional en la consola
         # para establecer permisos granulares a nivel de tabla y columna
@@ -6,11 +6,14 @@ This script automates the deployment of the AWS data pipeline infrastructure
 using AWS CDK. It includes prerequisite checks, deployment, and testing.
 """
 
+import argparse
 import os
 import sys
+import shlex
 import subprocess
 import json
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 def run_command(command, description=""):
     """Execute a command and return the result"""
@@ -21,8 +24,7 @@ def run_command(command, description=""):
     
     try:
         result = subprocess.run(
-            command,
-            shell=True,
+            shlex.split(command),
             capture_output=True,
             text=True,
             check=True
@@ -40,35 +42,36 @@ def run_command(command, description=""):
         if e.stderr:
             print(f"STDERR: {e.stderr}")
         return False, e.stderr
+    except FileNotFoundError as e:
+        print(f"ERROR: Command not found: {e.filename}")
+        return False, str(e)
+
+# (command, description, error message) for each prerequisite
+PREREQUISITES = [
+    ("node --version", "Checking Node.js...", "ERROR: Node.js is not installed"),
+    ("aws --version", "Checking AWS CLI...", "ERROR: AWS CLI is not installed"),
+    ("cdk --version", "Checking AWS CDK...",
+     "ERROR: AWS CDK is not installed\nInstall with: npm install -g aws-cdk"),
+    ("python --version", "Checking Python...", "ERROR: Python is not installed"),
+]
 
 def check_prerequisites():
-    """Check if all prerequisites are installed"""
+    """Check if all prerequisites are installed (checks run in parallel)"""
     print("Checking prerequisites...")
     
-    # Check Node.js
-    success, _ = run_command("node --version", "Checking Node.js...")
-    if not success:
-        print("ERROR: Node.js is not installed")
-        return False
-    
-    # Check AWS CLI
-    success, _ = run_command("aws --version", "Checking AWS CLI...")
-    if not success:
-        print("ERROR: AWS CLI is not installed")
-        return False
-    
-    # Check CDK
-    success, _ = run_command("cdk --version", "Checking AWS CDK...")
-    if not success:
-        print("ERROR: AWS CDK is not installed")
-        print("Install with: npm install -g aws-cdk")
-        return False
-    
-    # Check Python
-    success, _ = run_command("python --version", "Checking Python...")
-    if not success:
-        print("ERROR: Python is not installed")
-        return False
+    with ThreadPoolExecutor(max_workers=len(PREREQUISITES)) as executor:
+        futures = {
+            executor.submit(run_command, command, description): error
+            for command, description, error in PREREQUISITES
+        }
+        
+        for future in as_completed(futures):
+            success, _ = future.result()
+            if not success:
+                print(futures[future])
+                for pending in futures:
+                    pending.cancel()
+                return False
     
     print("All prerequisites are installed")
     return True
@@ -104,11 +107,23 @@ def bootstrap_cdk():
         print("CDK bootstrap failed")
         return False
 
-def deploy_stack():
-    """Deploy the CDK stack"""
+# Flags shared by both deploy modes: no approval prompt, parallel asset build/upload
+DEPLOY_FLAGS = "--require-approval never --asset-parallelism true --asset-prebuild true"
+
+def deploy_stack(fast=False):
+    """Deploy the CDK stack
+    
+    fast=True uses hotswap (Lambda code, IAM, etc. updated directly, without a
+    CloudFormation changeset) - for development stacks only
+    """
     print("\nDeploying CDK stack...")
     
-    success, output = run_command("cdk deploy --require-approval never", "Deploying infrastructure...")
+    if fast:
+        command = f"cdk deploy --hotswap --concurrency 4 {DEPLOY_FLAGS}"
+    else:
+        command = f"cdk deploy {DEPLOY_FLAGS}"
+    
+    success, output = run_command(command, "Deploying infrastructure...")
     
     if success:
         print("Stack deployment completed successfully")
@@ -178,6 +193,14 @@ def test_lambda_function(function_name):
 
 def main():
     """Main deployment function"""
+    parser = argparse.ArgumentParser(description="Deploy the AWS data pipeline")
+    parser.add_argument(
+        "--fast",
+        action="store_true",
+        help="Hotswap deployment for development (skips CloudFormation changesets)"
+    )
+    args = parser.parse_args()
+    
     print("AWS Data Pipeline - Deployment Script")
     print("=" * 50)
     
@@ -197,7 +220,7 @@ def main():
         return False
     
     # Deploy stack
-    success, output = deploy_stack()
+    success, output = deploy_stack(fast=args.fast)
     if not success:
         print("\nERROR: Stack deployment failed")
         return False
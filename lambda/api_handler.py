@@ -1,57 +1,127 @@
 """
 API Handler Lambda Function for Data Pipeline Testing
 
-This Lambda function provides REST API endpoints to interact with the data pipeline,
+This Lambda function provides HTTP API endpoints to interact with the data pipeline,
 allowing testing through tools like Postman or curl.
 
 Endpoints:
-- POST /process: Trigger data processing from a URL
+- POST /process: Trigger data processing from a URL, or get a presigned POST
+  to upload the data directly to S3 (processed when the upload lands)
 - GET /status/{job_id}: Check processing status
+- POST /status/batch: Check the status of several jobs at once
 - GET /results: List processed files and results
 """
 
-import json
+import base64
+import binascii
+import functools
+import io
+import orjson
 import boto3
+from boto3.dynamodb.conditions import Key
+from botocore.config import Config
+from boto3.s3.transfer import TransferConfig
 import uuid
+import urllib.parse
 import urllib.request
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
 import logging
 
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# AWS clients
-s3_client = boto3.client('s3')
+# AWS clients (SigV4 for S3 so presigned URLs reuse the cached signing key)
+s3_client = boto3.client('s3', config=Config(signature_version='s3v4'))
 dynamodb = boto3.resource('dynamodb')
 
+# Multipart settings for streaming raw downloads into S3
+RAW_UPLOAD_TRANSFER_CONFIG = TransferConfig(multipart_threshold=8 * 1024 * 1024, max_concurrency=8)
+
+# Worker threads for S3/DynamoDB calls that can run alongside the handler
+executor = ThreadPoolExecutor(max_workers=4)
+
 # Environment variables (set by CDK)
 BUCKET_NAME = os.environ.get('BUCKET_NAME', 'data-pipeline-bucket-12345')
 TABLE_NAME = os.environ.get('TABLE_NAME', 'data-pipeline-jobs')
 
+# Table handle reused across warm invocations
+jobs_table = dynamodb.Table(TABLE_NAME)
+
+# GSI on the jobs table (see DataPipelineStack), keyed by status and sorted
+# by updated_at: pages through completed jobs and counts jobs per status
+PROCESSED_INDEX_NAME = 'processed-index'
+
+# Page size for GET /results
+DEFAULT_RESULTS_PAGE_SIZE = 50
+MAX_RESULTS_PAGE_SIZE = 100
+
+# Presigned uploads land here and trigger processing (S3 notification)
+UPLOAD_KEY_SUFFIX = '/upload.json'
+UPLOAD_URL_EXPIRES_SECONDS = 3600
+
+# Largest download that /process parses and converts in memory; bigger
+# payloads are still stored in raw-data/ but not converted to Parquet
+MAX_INLINE_PROCESS_BYTES = 64 * 1024 * 1024
+
+# BatchGetItem accepts at most 100 keys per call
+BATCH_GET_MAX_KEYS = 100
+MAX_BATCH_STATUS_JOBS = 500
+# UnprocessedKeys are retried with exponential backoff (50 ms, 100 ms, ...)
+BATCH_GET_MAX_ATTEMPTS = 5
+BATCH_GET_BACKOFF_SECONDS = 0.05
+
+# In-memory job cache shared across warm invocations (read-through, like a
+# DAX item cache). Completed jobs never change, so they are kept until evicted;
+# anything else is only reused for a few seconds.
+JOB_CACHE_TTL_SECONDS = 5
+JOB_CACHE_MAX_ITEMS = 1024
+_job_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+
 def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """
     Main Lambda handler for API Gateway requests
     """
+    # Scheduled warm-up ping: keep the container alive without doing any work
+    if event.get('warmer'):
+        return create_response(200, {'status': 'warm'})
+    
+    # S3 notification for data uploaded through a presigned POST
+    if 'Records' in event:
+        return handle_upload_event(event)
+    
     try:
-        # Parse the request
-        http_method = event.get('httpMethod', '')
-        path = event.get('path', '')
+        # Parse the request (HTTP API payload v2, falling back to REST API v1 keys)
+        http_context = (event.get('requestContext') or {}).get('http') or {}
+        http_method = http_context.get('method') or event.get('httpMethod', '')
+        path = event.get('rawPath') or event.get('path', '')
         path_parameters = event.get('pathParameters') or {}
-        body = event.get('body', '{}')
+        query_parameters = event.get('queryStringParameters') or {}
+        body = event.get('body') or '{}'
+        if event.get('isBase64Encoded'):
+            body = base64.b64decode(body).decode('utf-8')
         
         logger.info(f"Processing {http_method} request to {path}")
         
         # Route the request
         if http_method == 'POST' and path == '/process':
             return handle_process_request(body)
+        elif http_method == 'POST' and path == '/status/batch':
+            return handle_batch_status_request(body)
         elif http_method == 'GET' and path.startswith('/status/'):
             job_id = path_parameters.get('job_id')
             return handle_status_request(job_id)
         elif http_method == 'GET' and path == '/results':
-            return handle_results_request()
+            return handle_results_request(query_parameters)
         elif http_method == 'GET' and path == '/health':
             return handle_health_check()
         else:
@@ -64,103 +134,87 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
 def handle_process_request(body: str) -> Dict[str, Any]:
     """
     Handle POST /process - Trigger data processing from URL
+    
+    With {"upload": true} instead of a URL, returns a presigned POST so the
+    client uploads the data to S3 itself; processing then happens when the
+    object is created (see handle_upload_event)
     """
     try:
         # Parse request body
         if isinstance(body, str):
-            request_data = json.loads(body)
+            request_data = orjson.loads(body)
         else:
             request_data = body
+        
+        # Generate job ID
+        job_id = str(uuid.uuid4())
+        now = datetime.utcnow()
+        
+        if request_data.get('upload') is True:
+            return handle_upload_request(job_id, now)
             
         url = request_data.get('url')
         if not url:
             return create_response(400, {'error': 'URL is required'})
         
-        # Generate job ID
-        job_id = str(uuid.uuid4())
-        
         # Download data from URL
         logger.info(f"Downloading data from URL: {url}")
         
         try:
-            with urllib.request.urlopen(url) as response:
-                data = response.read().decode('utf-8')
+            response = urllib.request.urlopen(url)
         except Exception as e:
             return create_response(400, {'error': f'Failed to download from URL: {str(e)}'})
         
-        # Upload raw data to S3
+        # Stream raw data to S3 in the background as it downloads (multipart
+        # above 8 MB), keeping an in-memory copy while it is small enough to
+        # process inline
         s3_key = f"raw-data/{job_id}/data.json"
+        raw_stream = TeeReader(response, MAX_INLINE_PROCESS_BYTES)
+        raw_upload = executor.submit(
+            s3_client.upload_fileobj,
+            raw_stream,
+            BUCKET_NAME,
+            s3_key,
+            ExtraArgs={'ContentType': 'application/json'},
+            Config=RAW_UPLOAD_TRANSFER_CONFIG
+        )
+        raw_upload.add_done_callback(lambda _: raw_stream.eof.set())
         
         try:
-            s3_client.put_object(
-                Bucket=BUCKET_NAME,
-                Key=s3_key,
-                Body=data,
-                ContentType='application/json'
-            )
+            # Once the download is complete, convert to Parquet while the
+            # last part of the raw upload is still in flight
+            raw_stream.eof.wait()
+            parquet_body = None
+            if not (raw_upload.done() and raw_upload.exception()):
+                parquet_body = build_parquet(raw_stream.getvalue())
+            
+            raw_upload.result()
             logger.info(f"Raw data uploaded to S3: s3://{BUCKET_NAME}/{s3_key}")
         except Exception as e:
             return create_response(500, {'error': f'Failed to upload to S3: {str(e)}'})
+        finally:
+            response.close()
         
-        # Process data and save as CSV
-        processed_s3_key = None
-        try:
-            # Parse JSON data
-            json_data = json.loads(data)
-            
-            # Convert to CSV format
-            if isinstance(json_data, list) and len(json_data) > 0:
-                import csv
-                import io
-                
-                # Create CSV content
-                csv_buffer = io.StringIO()
-                
-                # Get field names from first record
-                fieldnames = json_data[0].keys() if json_data else []
-                writer = csv.DictWriter(csv_buffer, fieldnames=fieldnames)
-                writer.writeheader()
-                
-                # Write data rows
-                for row in json_data:
-                    # Flatten nested objects if any
-                    flattened_row = {}
-                    for key, value in row.items():
-                        if isinstance(value, dict):
-                            # Flatten nested dict
-                            for nested_key, nested_value in value.items():
-                                flattened_row[f"{key}_{nested_key}"] = str(nested_value)
-                        else:
-                            flattened_row[key] = str(value) if value is not None else ''
-                    writer.writerow(flattened_row)
-                
-                # Upload processed CSV to S3
-                processed_s3_key = f"processed-data/{job_id}/data.csv"
-                s3_client.put_object(
-                    Bucket=BUCKET_NAME,
-                    Key=processed_s3_key,
-                    Body=csv_buffer.getvalue(),
-                    ContentType='text/csv'
-                )
-                logger.info(f"Processed data uploaded to S3: s3://{BUCKET_NAME}/{processed_s3_key}")
-                
-        except Exception as e:
-            logger.warning(f"Failed to process data to CSV: {str(e)}")
+        # The processed file is only written once the raw upload succeeded,
+        # so a failed job never leaves Parquet behind for the crawler
+        processed_s3_key, processed_size = None, None
+        if parquet_body is not None:
+            processed_s3_key, processed_size = upload_parquet(job_id, parquet_body, now)
         
         # Store job information in DynamoDB
         try:
-            table = dynamodb.Table(TABLE_NAME)
             job_status = 'completed' if processed_s3_key else 'processing'
             
-            table.put_item(
+            jobs_table.put_item(
                 Item={
                     'job_id': job_id,
                     'status': job_status,
                     'source_url': url,
                     's3_key': s3_key,
                     'processed_s3_key': processed_s3_key,
-                    'created_at': datetime.utcnow().isoformat(),
-                    'updated_at': datetime.utcnow().isoformat()
+                    'processed_size': processed_size,
+                    'created_at': now.isoformat(),
+                    'updated_at': now.isoformat()
                 }
             )
         except Exception as e:
@@ -173,12 +227,183 @@ def handle_process_request(body: str) -> Dict[str, Any]:
             's3_location': f's3://{BUCKET_NAME}/{s3_key}'
         })
         
-    except json.JSONDecodeError:
+    except orjson.JSONDecodeError:
         return create_response(400, {'error': 'Invalid JSON in request body'})
     except Exception as e:
         logger.error(f"Error in process request: {str(e)}")
         return create_response(500, {'error': str(e)})
 
+def handle_upload_request(job_id: str, now: datetime) -> Dict[str, Any]:
+    """
+    Create a job and a presigned POST for uploading its raw data to S3
+    """
+    s3_key = f"raw-data/{job_id}{UPLOAD_KEY_SUFFIX}"
+    
+    try:
+        presigned_post = s3_client.generate_presigned_post(
+            Bucket=BUCKET_NAME,
+            Key=s3_key,
+            Fields={'Content-Type': 'application/json'},
+            Conditions=[
+                {'Content-Type': 'application/json'},
+                ['content-length-range', 1, MAX_INLINE_PROCESS_BYTES]
+            ],
+            ExpiresIn=UPLOAD_URL_EXPIRES_SECONDS
+        )
+    except Exception as e:
+        return create_response(500, {'error': f'Failed to create upload URL: {str(e)}'})
+    
+    # Store job information in DynamoDB
+    try:
+        jobs_table.put_item(
+            Item={
+                'job_id': job_id,
+                'status': 'processing',
+                'source_url': None,
+                's3_key': s3_key,
+                'processed_s3_key': None,
+                'processed_size': None,
+                'created_at': now.isoformat(),
+                'updated_at': now.isoformat()
+            }
+        )
+    except Exception as e:
+        logger.warning(f"Failed to store job info in DynamoDB: {str(e)}")
+    
+    return create_response(202, {
+        'job_id': job_id,
+        'status': 'processing',
+        'message': 'Upload the data with the presigned POST; processing starts when it lands',
+        'upload': presigned_post,
+        's3_location': f's3://{BUCKET_NAME}/{s3_key}'
+    })
+
+def handle_upload_event(event: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Handle S3 ObjectCreated notifications for presigned uploads - convert the
+    uploaded data to Parquet and mark the job as completed
+    """
+    processed_jobs = []
+    
+    for record in event['Records']:
+        s3_key = urllib.parse.unquote_plus(record['s3']['object']['key'])
+        if not s3_key.startswith('raw-data/') or not s3_key.endswith(UPLOAD_KEY_SUFFIX):
+            logger.warning(f"Ignoring unexpected S3 object: {s3_key}")
+            continue
+        
+        job_id = s3_key.split('/')[1]
+        logger.info(f"Processing uploaded data for job {job_id}: s3://{BUCKET_NAME}/{s3_key}")
+        
+        try:
+            data = s3_client.get_object(Bucket=BUCKET_NAME, Key=s3_key)['Body'].read()
+        except Exception as e:
+            logger.error(f"Failed to read uploaded data for job {job_id}: {str(e)}")
+            continue
+        
+        now = datetime.utcnow()
+        processed_s3_key, processed_size = convert_to_parquet(job_id, data, now)
+        if not processed_s3_key:
+            continue
+        
+        # Update job information in DynamoDB (only for jobs created by /process)
+        try:
+            jobs_table.update_item(
+                Key={'job_id': job_id},
+                UpdateExpression=(
+                    'SET #status = :status, processed_s3_key = :processed_s3_key, '
+                    'processed_size = :processed_size, updated_at = :updated_at'
+                ),
+                ConditionExpression='attribute_exists(job_id)',
+                ExpressionAttributeNames={'#status': 'status'},
+                ExpressionAttributeValues={
+                    ':status': 'completed',
+                    ':processed_s3_key': processed_s3_key,
+                    ':processed_size': processed_size,
+                    ':updated_at': now.isoformat()
+                }
+            )
+            processed_jobs.append(job_id)
+        except Exception as e:
+            logger.warning(f"Failed to update job {job_id} in DynamoDB: {str(e)}")
+    
+    return create_response(200, {'processed_jobs': processed_jobs})
+
+@functools.lru_cache(maxsize=64)
+def get_writer_schema(columns: Tuple[str, ...]) -> pa.Schema:
+    """
+    Parquet schema for a set of flattened columns (all stored as strings),
+    cached so repeated same-shape payloads skip Arrow type inference
+    """
+    return pa.schema([(column, pa.string()) for column in columns])
+
+def convert_to_parquet(job_id: str, data: Optional[bytes], now: datetime) -> Tuple[Optional[str], Optional[int]]:
+    """
+    Flatten a downloaded JSON array and upload it as Parquet, returning the
+    processed S3 key and size (both None if the data could not be processed)
+    """
+    parquet_body = build_parquet(data)
+    if parquet_body is None:
+        return None, None
+    return upload_parquet(job_id, parquet_body, now)
+
+def build_parquet(data: Optional[bytes]) -> Optional[bytes]:
+    """
+    Flatten a downloaded JSON array into Snappy-compressed Parquet bytes
+    (None if the data could not be processed)
+    """
+    try:
+        if data is None:
+            raise ValueError(f"payload is larger than {MAX_INLINE_PROCESS_BYTES} bytes")
+        
+        # Parse JSON data
+        json_data = orjson.loads(data)
+        
+        # Convert to Parquet format
+        if not isinstance(json_data, list) or len(json_data) == 0:
+            return None
+        
+        # Flatten nested objects in a single vectorized pass
+        # (address.city -> address_city). convert_dtypes keeps integer
+        # columns with gaps as integers; missing values become ''
+        df = pd.json_normalize(json_data, sep='_').convert_dtypes()
+        df = df.astype(str).where(df.notna(), '')
+        
+        # Write it as Snappy-compressed Parquet
+        schema = get_writer_schema(tuple(df.columns))
+        parquet_buffer = io.BytesIO()
+        pq.write_table(
+            pa.Table.from_pandas(df, schema=schema, preserve_index=False),
+            parquet_buffer,
+            compression='snappy'
+        )
+        return parquet_buffer.getvalue()
+        
+    except Exception as e:
+        logger.warning(f"Failed to process data to Parquet: {str(e)}")
+        return None
+
+def upload_parquet(job_id: str, parquet_body: bytes, now: datetime) -> Tuple[Optional[str], Optional[int]]:
+    """
+    Upload processed Parquet to S3, partitioned by ingest date (Hive-style)
+    so Athena can prune partitions on time ranges
+    """
+    processed_s3_key = (
+        f"processed-data/year={now:%Y}/month={now:%m}/day={now:%d}/{job_id}.parquet"
+    )
+    try:
+        s3_client.put_object(
+            Bucket=BUCKET_NAME,
+            Key=processed_s3_key,
+            Body=parquet_body,
+            ContentType='application/x-parquet'
+        )
+    except Exception as e:
+        logger.warning(f"Failed to upload processed data to S3: {str(e)}")
+        return None, None
+    
+    logger.info(f"Processed data uploaded to S3: s3://{BUCKET_NAME}/{processed_s3_key}")
+    return processed_s3_key, len(parquet_body)
+
 def handle_status_request(job_id: Optional[str]) -> Dict[str, Any]:
     """
     Handle GET /status/{job_id} - Check processing status
@@ -187,38 +412,42 @@ def handle_status_request(job_id: Optional[str]) -> Dict[str, Any]:
         return create_response(400, {'error': 'Job ID is required'})
     
     try:
-        # Get job info from DynamoDB
-        table = dynamodb.Table(TABLE_NAME)
-        response = table.get_item(Key={'job_id': job_id})
+        # Get job info from the cache or DynamoDB
+        job_info = get_job(job_id)
         
-        if 'Item' not in response:
+        if job_info is None:
             return create_response(404, {'error': 'Job not found'})
         
-        job_info = response['Item']
-        
         # Check if processed files exist in S3
         processed_files = []
         try:
-            # List objects in the processed folder
+            # Processed files live under date partitions, so look up the
+            # job's own key instead of listing a per-job folder
+            processed_s3_key = job_info.get('processed_s3_key')
             s3_response = s3_client.list_objects_v2(
                 Bucket=BUCKET_NAME,
-                Prefix=f"processed-data/{job_id}/"
-            )
+                Prefix=processed_s3_key
+            ) if processed_s3_key else {}
             
             if 'Contents' in s3_response:
                 processed_files = [obj['Key'] for obj in s3_response['Contents']]
-                if processed_files:
+                if processed_files and job_info.get('status') != 'completed':
                     job_info['status'] = 'completed'
-                    # Update status in DynamoDB
-                    table.update_item(
-                        Key={'job_id': job_id},
-                        UpdateExpression='SET #status = :status, updated_at = :updated_at',
-                        ExpressionAttributeNames={'#status': 'status'},
-                        ExpressionAttributeValues={
-                            ':status': 'completed',
-                            ':updated_at': datetime.utcnow().isoformat()
-                        }
-                    )
+                    cache_job(job_info)
+                    # Update status in DynamoDB, unless another request already did
+                    try:
+                        jobs_table.update_item(
+                            Key={'job_id': job_id},
+                            UpdateExpression='SET #status = :status, updated_at = :updated_at',
+                            ConditionExpression='#status <> :status',
+                            ExpressionAttributeNames={'#status': 'status'},
+                            ExpressionAttributeValues={
+                                ':status': 'completed',
+                                ':updated_at': datetime.utcnow().isoformat()
+                            }
+                        )
+                    except jobs_table.meta.client.exceptions.ConditionalCheckFailedException:
+                        pass
         except Exception as e:
             logger.warning(f"Error checking processed files: {str(e)}")
         
@@ -235,37 +464,201 @@ def handle_status_request(job_id: Optional[str]) -> Dict[str, Any]:
         logger.error(f"Error checking job status: {str(e)}")
         return create_response(500, {'error': str(e)})
 
-def handle_results_request() -> Dict[str, Any]:
+def handle_batch_status_request(body: str) -> Dict[str, Any]:
+    """
+    Handle POST /status/batch - Check the status of several jobs at once
+    """
+    try:
+        # Parse request body
+        if isinstance(body, str):
+            request_data = orjson.loads(body)
+        else:
+            request_data = body
+        
+        if not isinstance(request_data, dict):
+            return create_response(400, {'error': 'Request body must be a JSON object'})
+        
+        job_ids = request_data.get('job_ids')
+        if not isinstance(job_ids, list) or not job_ids:
+            return create_response(400, {'error': 'job_ids must be a non-empty list'})
+        if not all(isinstance(job_id, str) for job_id in job_ids):
+            return create_response(400, {'error': 'job_ids must be strings'})
+        
+        # BatchGetItem rejects duplicate keys in one request
+        job_ids = list(dict.fromkeys(job_ids))
+        if len(job_ids) > MAX_BATCH_STATUS_JOBS:
+            return create_response(400, {'error': f'At most {MAX_BATCH_STATUS_JOBS} job_ids are allowed'})
+        
+        jobs = get_jobs(job_ids)
+        
+        return create_response(200, {
+            'jobs': [
+                {
+                    'job_id': job_id,
+                    'status': jobs[job_id].get('status', 'unknown'),
+                    'created_at': jobs[job_id].get('created_at'),
+                    'updated_at': jobs[job_id].get('updated_at'),
+                    'source_url': jobs[job_id].get('source_url'),
+                    'processed_s3_key': jobs[job_id].get('processed_s3_key')
+                }
+                for job_id in job_ids if job_id in jobs
+            ],
+            'not_found': [job_id for job_id in job_ids if job_id not in jobs]
+        })
+        
+    except orjson.JSONDecodeError:
+        return create_response(400, {'error': 'Invalid JSON in request body'})
+    except Exception as e:
+        logger.error(f"Error checking batch job status: {str(e)}")
+        return create_response(500, {'error': str(e)})
+
+def get_cached_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Return a job item from the in-memory cache if it has not expired
+    """
+    cached = _job_cache.get(job_id)
+    if cached is None:
+        return None
+    
+    expires_at, job_info = cached
+    if expires_at <= time.monotonic():
+        del _job_cache[job_id]
+        return None
+    return dict(job_info)
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Read a job item through the in-memory cache, falling back to DynamoDB
+    """
+    cached = get_cached_job(job_id)
+    if cached is not None:
+        return cached
+    
+    response = jobs_table.get_item(Key={'job_id': job_id})
+    if 'Item' not in response:
+        return None
+    
+    job_info = response['Item']
+    cache_job(job_info)
+    return dict(job_info)
+
+def get_jobs(job_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Read several job items through the in-memory cache, fetching the misses
+    with BatchGetItem in chunks of up to 100 keys
+    """
+    jobs = {}
+    missing = []
+    for job_id in job_ids:
+        cached = get_cached_job(job_id)
+        if cached is not None:
+            jobs[job_id] = cached
+        else:
+            missing.append(job_id)
+    
+    for start in range(0, len(missing), BATCH_GET_MAX_KEYS):
+        request_items = {
+            TABLE_NAME: {'Keys': [{'job_id': job_id} for job_id in missing[start:start + BATCH_GET_MAX_KEYS]]}
+        }
+        # Retry keys DynamoDB could not serve (e.g. throttled), backing off
+        # between attempts
+        for attempt in range(BATCH_GET_MAX_ATTEMPTS):
+            if attempt:
+                time.sleep(BATCH_GET_BACKOFF_SECONDS * 2 ** (attempt - 1))
+            response = dynamodb.batch_get_item(RequestItems=request_items)
+            for job_info in response.get('Responses', {}).get(TABLE_NAME, []):
+                cache_job(job_info)
+                jobs[job_info['job_id']] = dict(job_info)
+            request_items = response.get('UnprocessedKeys')
+            if not request_items:
+                break
+        else:
+            raise RuntimeError(f"BatchGetItem left keys unprocessed after {BATCH_GET_MAX_ATTEMPTS} attempts")
+    
+    return jobs
+
+def cache_job(job_info: Dict[str, Any]) -> None:
     """
-    Handle GET /results - List all processed files and results
+    Store a job item in the in-memory cache, evicting the oldest entry when full
+    """
+    ttl = float('inf') if job_info.get('status') == 'completed' else JOB_CACHE_TTL_SECONDS
+    
+    _job_cache.pop(job_info['job_id'], None)
+    if len(_job_cache) >= JOB_CACHE_MAX_ITEMS:
+        del _job_cache[next(iter(_job_cache))]
+    _job_cache[job_info['job_id']] = (time.monotonic() + ttl, dict(job_info))
+
+def handle_results_request(query_parameters: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Handle GET /results - List processed files (one page at a time) and results
+    
+    Query parameters:
+    - limit: files per page (default 50, max 100)
+    - cursor: next_cursor returned by the previous page
+    - presign: 'true' to include a download_url for each file
     """
     try:
-        # List all processed files in S3
+        try:
+            limit = int(query_parameters.get('limit', DEFAULT_RESULTS_PAGE_SIZE))
+        except ValueError:
+            return create_response(400, {'error': 'limit must be an integer'})
+        limit = max(1, min(limit, MAX_RESULTS_PAGE_SIZE))
+        presign = query_parameters.get('presign') == 'true'
+        
+        query_kwargs = {
+            'IndexName': PROCESSED_INDEX_NAME,
+            'KeyConditionExpression': Key('status').eq('completed'),
+            'ScanIndexForward': False,  # newest first
+            'Limit': limit
+        }
+        
+        cursor = query_parameters.get('cursor')
+        if cursor:
+            try:
+                query_kwargs['ExclusiveStartKey'] = decode_cursor(cursor)
+            except (ValueError, binascii.Error):
+                return create_response(400, {'error': 'Invalid cursor'})
+        
+        # Job statistics are counted in the background (one GSI COUNT query
+        # per status, in parallel) while this page is listed
+        count_futures = {
+            status: executor.submit(count_jobs_by_status, status)
+            for status in ('completed', 'processing')
+        }
+        
+        # List processed files from the job index; download URLs are only
+        # signed on request, and only for this page
         processed_files = []
+        next_cursor = None
         
         try:
-            s3_response = s3_client.list_objects_v2(
-                Bucket=BUCKET_NAME,
-                Prefix="processed-data/"
-            )
+            response = jobs_table.query(**query_kwargs)
             
-            if 'Contents' in s3_response:
-                for obj in s3_response['Contents']:
-                    if obj['Key'].endswith('.csv'):
-                        # Generate presigned URL for download
-                        presigned_url = s3_client.generate_presigned_url(
-                            'get_object',
-                            Params={'Bucket': BUCKET_NAME, 'Key': obj['Key']},
-                            ExpiresIn=3600  # 1 hour
-                        )
-                        
-                        processed_files.append({
-                            'file_name': obj['Key'].split('/')[-1],
-                            's3_key': obj['Key'],
-                            'size': obj['Size'],
-                            'last_modified': obj['LastModified'].isoformat(),
-                            'download_url': presigned_url
-                        })
+            for job in response.get('Items', []):
+                processed_s3_key = job.get('processed_s3_key')
+                if not processed_s3_key:
+                    continue
+                
+                processed_file = {
+                    'job_id': job['job_id'],
+                    'file_name': processed_s3_key.split('/')[-1],
+                    's3_key': processed_s3_key,
+                    'size': int(job['processed_size']) if job.get('processed_size') is not None else None,
+                    'last_modified': job.get('updated_at')
+                }
+                
+                if presign:
+                    # Generate presigned URL for download
+                    processed_file['download_url'] = s3_client.generate_presigned_url(
+                        'get_object',
+                        Params={'Bucket': BUCKET_NAME, 'Key': processed_s3_key},
+                        ExpiresIn=3600  # 1 hour
+                    )
+                
+                processed_files.append(processed_file)
+            
+            if response.get('LastEvaluatedKey'):
+                next_cursor = encode_cursor(response['LastEvaluatedKey'])
         except Exception as e:
             logger.warning(f"Error listing processed files: {str(e)}")
         
@@ -273,18 +666,9 @@ def handle_results_request() -> Dict[str, Any]:
         job_stats = {'total_jobs': 0, 'completed_jobs': 0, 'processing_jobs': 0}
         
         try:
-            table = dynamodb.Table(TABLE_NAME)
-            scan_response = table.scan()
-            
-            jobs = scan_response.get('Items', [])
-            job_stats['total_jobs'] = len(jobs)
-            
-            for job in jobs:
-                status = job.get('status', 'unknown')
-                if status == 'completed':
-                    job_stats['completed_jobs'] += 1
-                elif status == 'processing':
-                    job_stats['processing_jobs'] += 1
+            job_stats['completed_jobs'] = count_futures['completed'].result()
+            job_stats['processing_jobs'] = count_futures['processing'].result()
+            job_stats['total_jobs'] = job_stats['completed_jobs'] + job_stats['processing_jobs']
                     
         except Exception as e:
             logger.warning(f"Error getting job statistics: {str(e)}")
@@ -292,13 +676,50 @@ def handle_results_request() -> Dict[str, Any]:
         return create_response(200, {
             'processed_files': processed_files,
             'statistics': job_stats,
-            'total_files': len(processed_files)
+            'total_files': len(processed_files),
+            'next_cursor': next_cursor
         })
         
     except Exception as e:
         logger.error(f"Error getting results: {str(e)}")
         return create_response(500, {'error': str(e)})
 
+def encode_cursor(last_evaluated_key: Dict[str, Any]) -> str:
+    """
+    Encode a DynamoDB LastEvaluatedKey as an opaque URL-safe cursor
+    """
+    return base64.urlsafe_b64encode(orjson.dumps(last_evaluated_key)).decode('ascii')
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    """
+    Decode a cursor produced by encode_cursor back into an ExclusiveStartKey
+    """
+    start_key = orjson.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    if not isinstance(start_key, dict):
+        raise ValueError('cursor is not a key')
+    return start_key
+
+def count_jobs_by_status(status: str) -> int:
+    """
+    Count jobs in a given status by querying processed-index, following
+    LastEvaluatedKey so counts stay correct past the 1 MB page limit
+    """
+    query_kwargs = {
+        'IndexName': PROCESSED_INDEX_NAME,
+        'KeyConditionExpression': Key('status').eq(status),
+        'Select': 'COUNT'
+    }
+    count = 0
+    
+    while True:
+        response = jobs_table.query(**query_kwargs)
+        count += response.get('Count', 0)
+        
+        last_evaluated_key = response.get('LastEvaluatedKey')
+        if not last_evaluated_key:
+            return count
+        query_kwargs['ExclusiveStartKey'] = last_evaluated_key
+
 def handle_health_check() -> Dict[str, Any]:
     """
     Handle GET /health - Health check endpoint
@@ -322,5 +743,37 @@ def create_response(status_code: int, body: Dict[str, Any]) -> Dict[str, Any]:
             'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token',
             'Access-Control-Allow-Methods': 'GET,POST,OPTIONS'
         },
-        'body': json.dumps(body, indent=2)
-    }
\ No newline at end of file
+        'body': orjson.dumps(body, default=str, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+    }
+
+class TeeReader:
+    """
+    Read-only file-like wrapper that keeps a copy of everything read from the
+    underlying stream, until the copy would grow past max_bytes
+    """
+    
+    def __init__(self, stream: Any, max_bytes: int) -> None:
+        self._stream = stream
+        self._max_bytes = max_bytes
+        self._buffer: Optional[io.BytesIO] = io.BytesIO()
+        # Set once the underlying stream has been read to the end
+        self.eof = threading.Event()
+    
+    def read(self, size: int = -1) -> bytes:
+        chunk = self._stream.read(size)
+        if self._buffer is not None:
+            if self._buffer.tell() + len(chunk) > self._max_bytes:
+                # Too large to keep around; drop the copy
+                self._buffer = None
+            else:
+                self._buffer.write(chunk)
+        # Only signal once the chunk is in the copy, so getvalue() is complete
+        if not chunk or size is None or size < 0:
+            self.eof.set()
+        return chunk
+    
+    def getvalue(self) -> Optional[bytes]:
+        """
+        Return everything read so far, or None if it exceeded max_bytes
+        """
+        return self._buffer.getvalue() if self._buffer is not None else None
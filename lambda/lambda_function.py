@@ -1,22 +1,108 @@
+import csv
+from collections import deque
+import functools
+import gzip
+import hashlib
+import io
 import json
 import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 import urllib3
 import os
-from datetime import datetime
+import zlib
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timezone
 import logging
 
+try:
+    import orjson
+
+    def json_loads(data):
+        """Parse JSON from bytes or str"""
+        return orjson.loads(data)
+
+    def json_dumps_line(obj):
+        """Serialize to one compact JSON line (newline-terminated bytes)"""
+        return orjson.dumps(obj, option=orjson.OPT_APPEND_NEWLINE)
+except ImportError:
+    # orjson not installed: same interface on top of the standard library
+    def json_loads(data):
+        """Parse JSON from bytes or str"""
+        return json.loads(data)
+
+    def _json_default(obj):
+        """datetime support matching orjson's native output"""
+        if isinstance(obj, datetime):
+            return obj.isoformat()
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+    def json_dumps_line(obj):
+        """Serialize to one compact JSON line (newline-terminated bytes)"""
+        return json.dumps(obj, separators=(',', ':'), default=_json_default).encode('utf-8') + b'\n'
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 # Initialize clients
-s3_client = boto3.client('s3')
-http = urllib3.PoolManager()
+# Module-level clients keep their connections open across warm invocations
+# (and are captured in the SnapStart snapshot); the S3 pool is sized for the
+# JSON and CSV uploads running side by side
+s3_client = boto3.client('s3', config=Config(
+    max_pool_connections=50,
+    tcp_keepalive=True,
+    retries={'mode': 'standard', 'max_attempts': 3}
+))
+http = urllib3.PoolManager(
+    maxsize=10,
+    block=False,
+    headers={'Connection': 'keep-alive'},
+    retries=urllib3.Retry(total=3, backoff_factor=0.2)
+)
+executor = ThreadPoolExecutor(max_workers=2)
+
+# API responses larger than this are decoded incrementally; larger than
+# MAX_RESPONSE_BYTES (declared or actually read) are rejected
+STREAM_PARSE_THRESHOLD = 8 * 1024 * 1024
+MAX_RESPONSE_BYTES = 256 * 1024 * 1024
+READ_CHUNK_BYTES = 1024 * 1024
+
+# Rows written to the CSV buffer between yields
+CSV_CHUNK_ROWS = 1000
+
+# Fixed number of key prefixes the extracted files are spread over
+S3_KEY_SHARDS = 4
+
+# gzip level for the S3 bodies: level 1 is several times faster than the
+# default and still shrinks JSON/CSV several fold
+GZIP_LEVEL = 1
+
+# Bodies above this size go through a parallel multipart upload
+MULTIPART_THRESHOLD = 8 * 1024 * 1024
+UPLOAD_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=MULTIPART_THRESHOLD,
+    multipart_chunksize=10 * 1024 * 1024,
+    max_concurrency=10,
+    use_threads=True
+)
 
 def lambda_handler(event, context):
     """
     Lambda function that extracts data from a public API and saves it to S3
     """
+    # Scheduled warm-up ping: keep the container alive without doing any work
+    if event.get('warmer'):
+        return {
+            'statusCode': 200,
+            'body': json.dumps({'message': 'warm'})
+        }
+    
     try:
         # Get environment variables
         bucket_name = os.environ['BUCKET_NAME']
@@ -24,50 +110,64 @@ def lambda_handler(event, context):
         
         logger.info(f"Extracting data from: {api_url}")
         
-        # Make HTTP request to API
-        response = http.request('GET', api_url)
+        # Make HTTP request to API (body read by read_records)
+        response = http.request('GET', api_url, preload_content=False)
         
-        if response.status != 200:
-            raise Exception(f"API error: {response.status}")
-        
-        # Parse JSON response
-        data = json.loads(response.data.decode('utf-8'))
+        try:
+            if response.status != 200:
+                raise Exception(f"API error: {response.status}")
+            
+            # Parse JSON response
+            data = read_records(response)
+        finally:
+            response.release_conn()
         logger.info(f"Data extracted: {len(data)} records")
         
-        # Process data - add timestamp and metadata
-        processed_data = {
-            "extraction_timestamp": datetime.utcnow().isoformat(),
-            "source_api": api_url,
-            "record_count": len(data),
-            "data": data
-        }
-        
-        # Generate filename with timestamp
-        timestamp = datetime.utcnow().strftime("%Y/%m/%d/%H%M%S")
-        file_key = f"data/users/{timestamp}_users.json"
+        # One extraction timestamp for the payload and both S3 keys
+        now = datetime.now(timezone.utc)
+        timestamp = now.strftime("%Y/%m/%d/%H%M%S")
         
-        # Upload to S3
-        s3_client.put_object(
-            Bucket=bucket_name,
-            Key=file_key,
-            Body=json.dumps(processed_data, indent=2),
-            ContentType='application/json'
-        )
+        # Process data - one JSON line per record (NDJSON, splittable by
+        # Glue/Athena) with the timestamp and metadata on each record
+        json_lines = bytearray()
+        for record in data:
+            json_lines += json_dumps_line({
+                "extraction_timestamp": now,  # serialized natively as ISO 8601
+                "source_api": api_url,
+                **record
+            })
         
-        logger.info(f"Data saved to S3: s3://{bucket_name}/{file_key}")
+        # Generate filename with timestamp
+        file_key = get_data_key('users', f"{timestamp}_users.ndjson.gz")
         
-        # Also save in CSV format for better Glue compatibility
-        csv_data = convert_to_csv(data)
-        csv_file_key = f"data/users_csv/{timestamp}_users.csv"
+        # Upload to S3 (gzip-compressed, read natively by Glue and Athena) in
+        # the background while the CSV is generated and uploaded
+        json_body = gzip.compress(json_lines, compresslevel=GZIP_LEVEL, mtime=0)
+        json_upload = executor.submit(upload_body, bucket_name, file_key, json_body, 'application/x-ndjson')
         
-        s3_client.put_object(
-            Bucket=bucket_name,
-            Key=csv_file_key,
-            Body=csv_data,
-            ContentType='text/csv'
-        )
+        try:
+            # Also save in CSV format for better Glue compatibility, streamed
+            # row by row so the whole CSV is never held in memory
+            csv_file_key = get_data_key('users_csv', f"{timestamp}_users.csv.gz")
+            csv_stream = io.BufferedReader(IterStream(
+                gzip_chunks(iter_csv(data))
+            ))
+            
+            s3_client.upload_fileobj(
+                csv_stream,
+                bucket_name,
+                csv_file_key,
+                ExtraArgs={'ContentType': 'text/csv', 'ContentEncoding': 'gzip'},
+                Config=UPLOAD_TRANSFER_CONFIG
+            )
+            
+            logger.info(f"CSV data saved to S3: s3://{bucket_name}/{csv_file_key}")
+        finally:
+            # Never return (and get frozen) with the JSON upload still in flight
+            wait([json_upload])
         
-        logger.info(f"CSV data saved to S3: s3://{bucket_name}/{csv_file_key}")
+        json_upload.result()
+        logger.info(f"Data saved to S3: s3://{bucket_name}/{file_key}")
         
         return {
             'statusCode': 200,
@@ -88,46 +188,204 @@ def lambda_handler(event, context):
             })
         }
 
+def read_records(response):
+    """
+    Parses the JSON array returned by the API. Bodies up to
+    STREAM_PARSE_THRESHOLD are parsed in one go; larger ones are decoded
+    incrementally from the socket instead of being buffered whole. Either way
+    reading fails once more than MAX_RESPONSE_BYTES arrive
+    """
+    content_length = response.headers.get('Content-Length')
+    if content_length is not None and int(content_length) > MAX_RESPONSE_BYTES:
+        raise Exception(f"API response too large: {content_length} bytes")
+    
+    reader = BoundedReader(response, MAX_RESPONSE_BYTES)
+    head = reader.peek(STREAM_PARSE_THRESHOLD + 1)
+    
+    if len(head) <= STREAM_PARSE_THRESHOLD or ijson is None:
+        return json_loads(reader.read())
+    
+    return list(ijson.items(reader, 'item', use_float=True))
+
+def get_data_key(dataset, file_path):
+    """
+    Builds the S3 key for a dataset file with a small fixed shard level after
+    the dataset folder (data/users/shard=2/2024/01/01/...): writes spread over
+    S3_KEY_SHARDS prefixes while Glue sees only that many partition values
+    ahead of the date, and each dataset stays one table
+    """
+    digest = hashlib.md5(file_path.encode('utf-8'), usedforsecurity=False).digest()
+    shard = int.from_bytes(digest[:4], 'big') % S3_KEY_SHARDS
+    return f"data/{dataset}/shard={shard}/{file_path}"
+
+def upload_body(bucket_name, key, body, content_type):
+    """
+    Uploads a gzip-compressed bytes body to S3, using a parallel multipart
+    upload when it is larger than MULTIPART_THRESHOLD
+    """
+    if len(body) > MULTIPART_THRESHOLD:
+        s3_client.upload_fileobj(
+            io.BytesIO(body),
+            bucket_name,
+            key,
+            ExtraArgs={'ContentType': content_type, 'ContentEncoding': 'gzip'},
+            Config=UPLOAD_TRANSFER_CONFIG
+        )
+    else:
+        s3_client.put_object(
+            Bucket=bucket_name,
+            Key=key,
+            Body=body,
+            ContentType=content_type,
+            ContentEncoding='gzip'
+        )
+
+def gzip_chunks(chunks):
+    """
+    Gzip-compresses an iterator of bytes chunks on the fly
+    """
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
 def convert_to_csv(data):
     """
     Converts JSON data to CSV format
     """
+    return b''.join(iter_csv(data)).decode('utf-8')
+
+def iter_csv(data):
+    """
+    Converts JSON data to CSV format, yielding it as UTF-8 bytes in chunks of rows
+    """
     if not data:
-        return ""
+        return
     
-    # Get headers from first row
-    headers = []
-    first_record = data[0]
+    # Headers and key paths come from the first record, computed once
+    paths = get_csv_paths(data[0])
     
-    def flatten_dict(d, parent_key='', sep='_'):
-        items = []
-        for k, v in d.items():
-            new_key = f"{parent_key}{sep}{k}" if parent_key else k
-            if isinstance(v, dict):
-                items.extend(flatten_dict(v, new_key, sep=sep).items())
-            else:
-                items.append((new_key, v))
-        return dict(items)
+    # The csv module (C) handles quoting and the text layer encodes to UTF-8
+    # as rows are written; rows are drained from the buffer every
+    # CSV_CHUNK_ROWS so the output is never held in memory at once
+    buffer = io.BytesIO()
+    text = io.TextIOWrapper(buffer, encoding='utf-8', newline='')
+    writer = csv.writer(text, lineterminator='\n')
+    writer.writerow([header for header, _ in paths])
     
-    # Flatten first record to get headers
-    flattened_first = flatten_dict(first_record)
-    headers = list(flattened_first.keys())
+    for index, record in enumerate(data, 1):
+        writer.writerow([get_path_value(record, path) for _, path in paths])
+        if index % CSV_CHUNK_ROWS == 0:
+            text.flush()
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
     
-    # Create CSV
-    csv_lines = []
-    csv_lines.append(','.join(headers))
+    text.flush()
+    yield buffer.getvalue()
+
+def get_csv_paths(record, sep='_'):
+    """
+    Returns (header, key path) for every leaf of a record,
+    e.g. ('address_geo_lat', ('address', 'geo', 'lat')); headers are joined
+    once per leaf from the tuple path
+    """
+    paths = []
     
-    for record in data:
-        flattened = flatten_dict(record)
-        row = []
-        for header in headers:
-            value = flattened.get(header, '')
-            # Escape quotes and commas
-            if isinstance(value, str):
-                value = value.replace('"', '""')
-                if ',' in value or '"' in value or '\n' in value:
-                    value = f'"{value}"'
-            row.append(str(value))
-        csv_lines.append(','.join(row))
+    # Iterative depth-first walk: a stack of (parent path, items iterator),
+    # so nested dicts keep their key order without recursive calls
+    stack = deque([((), iter(record.items()))])
+    while stack:
+        parent, items = stack[-1]
+        for k, v in items:
+            path = parent + (k,)
+            if isinstance(v, dict):
+                stack.append((path, iter(v.items())))
+                break
+            paths.append((sep.join(path), path))
+        else:
+            stack.pop()
     
-    return '\n'.join(csv_lines)
\ No newline at end of file
+    return paths
+
+def get_path_value(record, path):
+    """
+    Follows a key path into a record ('' when it is missing)
+    """
+    return functools.reduce(
+        lambda d, k: d.get(k, '') if isinstance(d, dict) else '', path, record
+    )
+
+class IterStream(io.RawIOBase):
+    """
+    Read-only file-like object over an iterator of bytes chunks, so generated
+    content can be passed to upload_fileobj without building it in memory
+    """
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._pending = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._pending:
+            try:
+                self._pending = next(self._chunks)
+            except StopIteration:
+                return 0
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+class BoundedReader:
+    """
+    Read-only file-like wrapper that fails once more than max_bytes have been
+    read from the underlying stream, whatever its Content-Length says
+    """
+
+    def __init__(self, stream, max_bytes):
+        self._stream = stream
+        self._max_bytes = max_bytes
+        self._bytes_read = 0
+        self._head = io.BytesIO()
+
+    def peek(self, size):
+        """
+        Reads ahead up to size bytes (fewer only at the end of the stream);
+        they are returned again by read()
+        """
+        chunks = [self._head.read()]
+        buffered = len(chunks[0])
+        while buffered < size:
+            chunk = self._read_stream(size - buffered)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            buffered += len(chunk)
+        head = b''.join(chunks)
+        self._head = io.BytesIO(head)
+        return head
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            chunks = [self._head.read()]
+            while True:
+                chunk = self._read_stream(READ_CHUNK_BYTES)
+                if not chunk:
+                    return b''.join(chunks)
+                chunks.append(chunk)
+        
+        chunk = self._head.read(size)
+        return chunk if chunk else self._read_stream(size)
+
+    def _read_stream(self, size):
+        chunk = self._stream.read(size)
+        self._bytes_read += len(chunk)
+        if self._bytes_read > self._max_bytes:
+            raise Exception(f"API response too large: more than {self._max_bytes} bytes")
+        return chunk
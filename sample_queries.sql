@@ -205,6 +205,18 @@ GROUP BY year, month, day
 ORDER BY day;
 */
 
+-- Consulta 16b: Datos procesados por la API (Parquet particionado por fecha)
+-- El filtro sobre year/month/day permite a Athena leer solo esas particiones
+SELECT 
+    year,
+    month,
+    day,
+    COUNT(*) as records_per_day
+FROM processed_data
+WHERE year = '2024' AND month = '01'
+GROUP BY year, month, day
+ORDER BY day;
+
 -- =====================================================
 -- CONSULTAS DE EXPORTACIÓN
 -- =====================================================